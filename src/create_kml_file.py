@@ -5,22 +5,49 @@ This module provides functions to:
 - Generate a KML file from a DataFrame containing GPS data.
 - Create a temporary KML file and open it with the system's default application.
 - Validate and structure GPS and optional altitude data for KML export.
+- Build the KML document without any user interaction, for use from scripts.
 
 Functions:
-    create_kml_file(df, source_filename): Create and save a KML file from a DataFrame.
+    create_kml_file(df, source_filename, show_message): Create and save a KML file from a DataFrame.
     view_kml_file(df, source_filename): Create and open a temporary KML file.
-    create_kml_file_structure(df, source_filename, kml_filename): Build and write the KML structure.
+    create_kml_file_structure(df, source_filename, kml_filename, pretty, show_message): Build and
+        write the KML structure.
+    build_kml_bytes(df, source_filename, pretty): Build the KML document and return it as bytes.
+    build_many_kml(dfs_and_names, max_workers): Build the KML documents for several logs in
+        parallel.
+    write_kml(df, source_filename, f, pretty): Build the KML document and write it to a file-like
+        object.
 
 Requires:
     - pandas
+    - numpy
     - tkinter
-    - xml.etree.ElementTree
+    - lxml
 """
 
 from tkinter import messagebox
+from concurrent.futures import ProcessPoolExecutor
+import io
 import os
+from gps_data import get_gps_arrays, to_local_meters
+from utils_numba import rdp_mask
 
-def create_kml_file(df, source_filename):
+# Number of track points formatted and written to the KML file at a time
+COORDS_BATCH_SIZE = 4096
+
+# Columns that must be present to create a KML file
+REQUIRED_GPS_COLS = frozenset({'GPS.Latitude', 'GPS.Longitude'})
+
+# Names of the columns that may hold altitude data, in order of preference
+ALT_CANDIDATES = ('GPS alt (m)', 'GPS alt(m)', 'GPS.Altitude', 'Altitude')
+
+# Tolerance used when simplifying the track, in meters
+KML_SIMPLIFY_TOLERANCE_M = 0.1
+
+# Placeholder for the track coordinates, which are streamed separately from the rest of the tree
+COORDS_MARKER = "__TRACK_COORDINATES__"
+
+def create_kml_file(df, source_filename, show_message=True):
     """
     Create a KML file from the provided DataFrame and source filename.
 
@@ -30,15 +57,20 @@ def create_kml_file(df, source_filename):
     Args:
         df (pd.DataFrame): The DataFrame containing the log data.
         source_filename (str): The original CSV filename.
+        show_message (bool): If False, do not show a message box when the file is created, or if
+            it can't be created.
 
     Returns:
-        None
+        bool: True if the file was created successfully, False otherwise.
     """
     # Change extension from .csv to .kml
     base, _ = os.path.splitext(source_filename)
     kml_filename = base + ".kml"
-    create_kml_file_structure(df, source_filename, kml_filename)
-    messagebox.showinfo("Create KML File", f"KML file created: {kml_filename}")
+    create_file_success = create_kml_file_structure(df, source_filename, kml_filename,
+                                                    show_message=show_message)
+    if create_file_success and show_message:
+        messagebox.showinfo("Create KML File", f"KML file created: {kml_filename}")
+    return create_file_success
 
 
 def view_kml_file(df, source_filename):
@@ -58,7 +90,9 @@ def view_kml_file(df, source_filename):
     """
     # Create a temporary KML file
     temp_kml = "temp.kml"
-    create_kml_file_structure(df, source_filename, temp_kml)
+    if not create_kml_file_structure(df, source_filename, temp_kml, pretty=True):
+        # The error has already been reported, and any existing file is from an earlier log
+        return
     # Open the KML file with the default application
     try:
         if os.name == 'nt':  # Windows
@@ -73,182 +107,285 @@ def view_kml_file(df, source_filename):
         messagebox.showerror("View KML File", f"Could not open KML file: {e}")
 
 
-def create_kml_file_structure(df, source_filename, kml_filename):
+def create_kml_file_structure(df, source_filename, kml_filename, pretty=False, show_message=True):
     """
     Generate the KML file structure and write it to disk.
 
-    This function validates the presence of required GPS columns, removes rows with missing 
-    GPS data, and creates a KML file with placemarks for the start and end points, as well as 
-    the flight path.
+    This function writes the KML document produced by write_kml to a temporary file next to the
+    output file, which replaces the output file only once the document is complete. If the data
+    can't be exported, no empty or partly written KML file is left behind.
 
     Args:
         df (pd.DataFrame): The DataFrame containing the log data.
         source_filename (str): The original CSV filename.
         kml_filename (str): The output KML filename.
+        pretty (bool): If True, indent the KML so that it is easier to read. This is not needed
+            by programs that read KML files, so it is off by default.
+        show_message (bool): If False, an error is only printed, without showing a message box.
 
     Returns:
         bool: True if the file was created successfully, False otherwise.
     """
+    temp_filename = kml_filename + ".tmp"
     try:
-        import xml.etree.ElementTree as ET
+        with open(temp_filename, 'wb') as f:
+            write_kml(df, source_filename, f, pretty)
+        os.replace(temp_filename, kml_filename)
 
+        create_file_success = True
+        print(f"KML file saved: {kml_filename}")
+
+    except Exception as e:
+        if os.path.exists(temp_filename):
+            os.remove(temp_filename)
+        if show_message:
+            messagebox.showerror("Error", f"Error creating KML file:\n{e}")
+        print(f"KML creation error: {e}")
         create_file_success = False
 
-        if not {'GPS.Latitude', 'GPS.Longitude'}.issubset(df.columns):
-            raise ValueError(
-                "DataFrame must contain 'GPS.Latitude' and 'GPS.Longitude' columns.")
-
-        # Check for altitude data
-        alt_col_name = None
-        for col in ['GPS alt (m)', 'GPS alt(m)', 'GPS.Altitude', 'Altitude']:
-            if col in df:
-                alt_col_name = col
-                break
-
-        # Remove rows with NaN in GPS columns
-        gps_cols = ['GPS.Latitude', 'GPS.Longitude']
-        if alt_col_name in df.columns:
-            gps_cols.append(alt_col_name)
-
-        df_valid = df.dropna(subset=gps_cols)
-
-        # Check for DateTime data
-        datetime_col_name = None
-        if 'DateTime' in df_valid:
-            datetime_col_name = 'DateTime'
-
-        if len(df['GPS.Latitude']) == 0:
-            messagebox.showerror(
-                "Error", "No valid GPS data found for KML creation!")
-            return
-
-        # Create KML structure
-        kml = ET.Element('kml', xmlns="http://www.opengis.net/kml/2.2")
-        document = ET.SubElement(kml, 'Document')
-
-        # Add document name and description
-        name = ET.SubElement(document, 'name')
-        name.text = "Flight Track"
-
-        description = ET.SubElement(document, 'description')
-        description.text = f"GPS track exported from log file {os.path.basename(source_filename)}"\
-            f" by EthosLogAnalyzer"
-
-        # Add style for the track line
-        style = ET.SubElement(document, 'Style', id="trackStyle")
-        linestyle = ET.SubElement(style, 'LineStyle')
-        color = ET.SubElement(linestyle, 'color')
-        color.text = "ff0000ff"  # Red line in KML format (AABBGGRR)
-        width = ET.SubElement(linestyle, 'width')
-        width.text = "3"
-
-        # Add style for start point
-        start_style = ET.SubElement(document, 'Style', id="startStyle")
-        iconstyle = ET.SubElement(start_style, 'IconStyle')
-        icon = ET.SubElement(iconstyle, 'Icon')
-        href = ET.SubElement(icon, 'href')
-        href.text = "http://maps.google.com/mapfiles/kml/paddle/grn-circle.png"
-
-        # Add style for end point
-        end_style = ET.SubElement(document, 'Style', id="endStyle")
-        iconstyle = ET.SubElement(end_style, 'IconStyle')
-        icon = ET.SubElement(iconstyle, 'Icon')
-        href = ET.SubElement(icon, 'href')
-        href.text = "http://maps.google.com/mapfiles/kml/paddle/red-circle.png"
-
-        # Create placemark for start point
-        start_placemark = ET.SubElement(document, 'Placemark')
-        start_name = ET.SubElement(start_placemark, 'name')
-        start_name.text = "Start"
-        start_desc = ET.SubElement(start_placemark, 'description')
-
-        start_desc.text = f"Flight start point\\nLat: {df_valid['GPS.Latitude'].iloc[0]}\\nLon:"\
-            f" {df_valid['GPS.Longitude'].iloc[0]}"
-        if alt_col_name is not None:
-            start_desc.text += f"\\nAlt: {df_valid[alt_col_name].iloc[0]}m"
-
-        start_styleurl = ET.SubElement(start_placemark, 'styleUrl')
-        start_styleurl.text = "#startStyle"
-
-        start_point = ET.SubElement(start_placemark, 'Point')
-        start_coords = ET.SubElement(start_point, 'coordinates')
-        if alt_col_name is not None:
-            start_coords.text = f"{df_valid['GPS.Longitude'].iloc[0]},"\
-                f"{df_valid['GPS.Latitude'].iloc[0]},{df_valid[alt_col_name].iloc[0]}"
-        else:
-            start_coords.text = f"{df_valid['GPS.Longitude'].iloc[0]},"\
-                f"{df_valid['GPS.Latitude'].iloc[0]},0"
-
-        # Create placemark for end point
-        end_placemark = ET.SubElement(document, 'Placemark')
-        end_name = ET.SubElement(end_placemark, 'name')
-        end_name.text = "End"
-        end_desc = ET.SubElement(end_placemark, 'description')
-        end_desc.text = f"Flight end point\\nLat: {df_valid['GPS.Latitude'].iloc[-1]}\\n"\
-            f"Lon: {df_valid['GPS.Longitude'].iloc[-1]}"
-        if alt_col_name is not None:
-            end_desc.text += f"\\nAlt: {df_valid[alt_col_name].iloc[-1]}m"
-
-        end_styleurl = ET.SubElement(end_placemark, 'styleUrl')
-        end_styleurl.text = "#endStyle"
-
-        end_point = ET.SubElement(end_placemark, 'Point')
-        end_coords = ET.SubElement(end_point, 'coordinates')
-        if alt_col_name is not None:
-            end_coords.text = f"{df_valid['GPS.Longitude'].iloc[-1]},"\
-                f"{df_valid['GPS.Latitude'].iloc[-1]},{df_valid[alt_col_name].iloc[-1]}"
-        else:
-            end_coords.text = f"{df_valid['GPS.Longitude'].iloc[-1]},"\
-                "{df_valid['GPS.Latitude'].iloc[-1]},0"
+    return create_file_success
 
-        # Create placemark for the track
-        track_placemark = ET.SubElement(document, 'Placemark')
-        track_name = ET.SubElement(track_placemark, 'name')
-        track_name.text = "Flight Path"
 
-        track_desc = ET.SubElement(track_placemark, 'description')
-        track_desc.text = f"""Flight track with {len(df_valid['GPS.Latitude'])} GPS points
-Altitude data: {'Yes' if alt_col_name is not None else 'No'}
-Timestamp data: {'Yes' if datetime_col_name is not None else 'No'}"""
+def build_kml_bytes(df, source_filename, pretty=False):
+    """
+    Generate the KML document for a DataFrame and return it as bytes.
 
-        track_styleurl = ET.SubElement(track_placemark, 'styleUrl')
-        track_styleurl.text = "#trackStyle"
+    This does not interact with the user or the file system, so it can be used from scripts.
 
-        # Create LineString for the track
-        linestring = ET.SubElement(track_placemark, 'LineString')
+    Args:
+        df (pd.DataFrame): The DataFrame containing the log data.
+        source_filename (str): The original CSV filename, used only as a reference in the KML file.
+        pretty (bool): If True, indent the KML so that it is easier to read.
 
-        # Set altitude mode
-        altmode = ET.SubElement(linestring, 'altitudeMode')
-        altmode.text = "absolute" if alt_col_name is not None else "clampToGround"
+    Returns:
+        bytes: The UTF-8 encoded KML document.
 
-        # Create coordinates string
-        coords_list = []
-        for i in range(len(df_valid['GPS.Latitude'])):
-            if alt_col_name is not None:
-                coords_list.append(
-                    f"{df_valid['GPS.Longitude'].iloc[i]},{df_valid['GPS.Latitude'].iloc[i]},"\
-                        f"{df_valid[alt_col_name].iloc[i]}")
-            else:
-                coords_list.append(
-                    f"{df_valid['GPS.Longitude'].iloc[i]},{df_valid['GPS.Latitude'].iloc[i]},0")
+    Raises:
+        ValueError: If the DataFrame has no valid GPS data.
+    """
+    buffer = io.BytesIO()
+    write_kml(df, source_filename, buffer, pretty)
+    return buffer.getvalue()
 
-        coordinates = ET.SubElement(linestring, 'coordinates')
-        coordinates.text = ' '.join(coords_list)
 
-        # Create the tree and write to file
-        tree = ET.ElementTree(kml)
-        ET.indent(tree, space="  ", level=0)  # Pretty print formatting
+def build_many_kml(dfs_and_names, max_workers=None):
+    """
+    Generate the KML documents for several logs in parallel.
 
-        # Write KML file with XML declaration
-        with open(kml_filename, 'wb') as f:
-            tree.write(f, encoding='utf-8', xml_declaration=True)
+    Each document is built by build_kml_bytes in a separate worker process, so the work is spread
+    over all CPU cores. Nothing is written to disk; the caller writes the returned documents. On
+    platforms that start worker processes by spawning (e.g. Windows) this must be called from
+    code protected by an `if __name__ == "__main__":` guard.
 
-        create_file_success = True
-        print(f"KML file saved: {kml_filename}")
+    Args:
+        dfs_and_names (iterable): (df, source_filename) pairs, one for each log.
+        max_workers (int, optional): Maximum number of worker processes. Defaults to the number
+            of CPUs.
 
-    except Exception as e:
-        messagebox.showerror("Error", f"Error creating KML file:\n{e}")
-        print(f"KML creation error: {e}")
-        create_file_success = False
+    Returns:
+        list: The KML document for each log, as bytes, in the same order as dfs_and_names.
 
-    return create_file_success
+    Raises:
+        ValueError: If one of the DataFrames has no valid GPS data.
+    """
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+        return list(executor.map(_build_one_kml, dfs_and_names))
+
+
+def _build_one_kml(df_and_name):
+    """
+    Build the KML document for one (df, source_filename) pair. Used by build_many_kml, and
+    defined at module level so that it can be sent to the worker processes.
+    """
+    df, source_filename = df_and_name
+    return build_kml_bytes(df, source_filename)
+
+
+def write_kml(df, source_filename, f, pretty=False):
+    """
+    Generate the KML document for a DataFrame and write it to a binary file-like object.
+
+    This function validates the presence of required GPS columns, removes rows with missing 
+    GPS data, and creates a KML document with placemarks for the start and end points, as well as 
+    the flight path. The flight path is simplified to drop points that lie within
+    KML_SIMPLIFY_TOLERANCE_M of the line through their neighbours.
+
+    Args:
+        df (pd.DataFrame): The DataFrame containing the log data.
+        source_filename (str): The original CSV filename, used only as a reference in the KML file.
+        f (file-like): Binary file-like object that the KML document is written to.
+        pretty (bool): If True, indent the KML so that it is easier to read.
+
+    Returns:
+        None
+
+    Raises:
+        ValueError: If the DataFrame has no valid GPS data.
+    """
+    from lxml import etree as ET
+
+    if not REQUIRED_GPS_COLS.issubset(df.columns):
+        raise ValueError(
+            "DataFrame must contain 'GPS.Latitude' and 'GPS.Longitude' columns.")
+
+    # Check for altitude data, using the first of ALT_CANDIDATES found in the DataFrame
+    df_columns = set(df.columns)
+    alt_col_name = next((col for col in ALT_CANDIDATES if col in df_columns), None)
+
+    # Get the valid GPS data as float NumPy arrays, with rows that are missing any of the GPS
+    # values removed. Only the GPS columns are extracted, rather than copying the whole
+    # DataFrame with dropna. The arrays are cached, so this is cheap if the same log has
+    # already been shown on the 2D map or exported.
+    lat_arr, lon_arr, alt_arr = get_gps_arrays(df, alt_col_name)
+    n_points = len(lat_arr)
+
+    # Check for DateTime data
+    datetime_col_name = None
+    if 'DateTime' in df.columns:
+        datetime_col_name = 'DateTime'
+
+    if n_points == 0:
+        raise ValueError("No valid GPS data found for KML creation!")
+
+    # Create KML structure
+    kml = ET.Element('kml', xmlns="http://www.opengis.net/kml/2.2")
+    document = ET.SubElement(kml, 'Document')
+
+    # Add document name and description
+    name = ET.SubElement(document, 'name')
+    name.text = "Flight Track"
+
+    description = ET.SubElement(document, 'description')
+    description.text = f"GPS track exported from log file {os.path.basename(source_filename)}"\
+        f" by EthosLogAnalyzer"
+
+    # Add style for the track line
+    style = ET.SubElement(document, 'Style', id="trackStyle")
+    linestyle = ET.SubElement(style, 'LineStyle')
+    color = ET.SubElement(linestyle, 'color')
+    color.text = "ff0000ff"  # Red line in KML format (AABBGGRR)
+    width = ET.SubElement(linestyle, 'width')
+    width.text = "3"
+
+    # Add style for start point
+    start_style = ET.SubElement(document, 'Style', id="startStyle")
+    iconstyle = ET.SubElement(start_style, 'IconStyle')
+    icon = ET.SubElement(iconstyle, 'Icon')
+    href = ET.SubElement(icon, 'href')
+    href.text = "http://maps.google.com/mapfiles/kml/paddle/grn-circle.png"
+
+    # Add style for end point
+    end_style = ET.SubElement(document, 'Style', id="endStyle")
+    iconstyle = ET.SubElement(end_style, 'IconStyle')
+    icon = ET.SubElement(iconstyle, 'Icon')
+    href = ET.SubElement(icon, 'href')
+    href.text = "http://maps.google.com/mapfiles/kml/paddle/red-circle.png"
+
+    # Start and end point values, extracted once for the placemarks below
+    lat_start, lat_end = float(lat_arr[0]), float(lat_arr[-1])
+    lon_start, lon_end = float(lon_arr[0]), float(lon_arr[-1])
+    if alt_arr is not None:
+        alt_start, alt_end = float(alt_arr[0]), float(alt_arr[-1])
+    else:
+        alt_start, alt_end = 0, 0
+
+    # Create placemark for start point
+    start_placemark = ET.SubElement(document, 'Placemark')
+    start_name = ET.SubElement(start_placemark, 'name')
+    start_name.text = "Start"
+    start_desc = ET.SubElement(start_placemark, 'description')
+
+    start_desc.text = f"Flight start point\\nLat: {lat_start}\\nLon: {lon_start}"
+    if alt_arr is not None:
+        start_desc.text += f"\\nAlt: {alt_start}m"
+
+    start_styleurl = ET.SubElement(start_placemark, 'styleUrl')
+    start_styleurl.text = "#startStyle"
+
+    start_point = ET.SubElement(start_placemark, 'Point')
+    start_coords = ET.SubElement(start_point, 'coordinates')
+    start_coords.text = f"{lon_start},{lat_start},{alt_start}"
+
+    # Create placemark for end point
+    end_placemark = ET.SubElement(document, 'Placemark')
+    end_name = ET.SubElement(end_placemark, 'name')
+    end_name.text = "End"
+    end_desc = ET.SubElement(end_placemark, 'description')
+    end_desc.text = f"Flight end point\\nLat: {lat_end}\\nLon: {lon_end}"
+    if alt_arr is not None:
+        end_desc.text += f"\\nAlt: {alt_end}m"
+
+    end_styleurl = ET.SubElement(end_placemark, 'styleUrl')
+    end_styleurl.text = "#endStyle"
+
+    end_point = ET.SubElement(end_placemark, 'Point')
+    end_coords = ET.SubElement(end_point, 'coordinates')
+    end_coords.text = f"{lon_end},{lat_end},{alt_end}"
+
+    # Simplify the track, dropping points that are within KML_SIMPLIFY_TOLERANCE_M of the
+    # line through their neighbours. The points are converted to approximate local
+    # coordinates in meters so that the tolerance, and the altitude, are in the same units.
+    # This is done before the track description is written, so that it gives the number of
+    # points actually in the file.
+    keep = rdp_mask(to_local_meters(lat_arr, lon_arr, alt_arr), KML_SIMPLIFY_TOLERANCE_M)
+    n_track_points = int(keep.sum())
+
+    # Create placemark for the track
+    track_placemark = ET.SubElement(document, 'Placemark')
+    track_name = ET.SubElement(track_placemark, 'name')
+    track_name.text = "Flight Path"
+
+    track_desc = ET.SubElement(track_placemark, 'description')
+    track_desc.text = f"""Flight track with {n_track_points} GPS points
+Altitude data: {'Yes' if alt_col_name is not None else 'No'}
+Timestamp data: {'Yes' if datetime_col_name is not None else 'No'}"""
+
+    track_styleurl = ET.SubElement(track_placemark, 'styleUrl')
+    track_styleurl.text = "#trackStyle"
+
+    # Create LineString for the track
+    linestring = ET.SubElement(track_placemark, 'LineString')
+
+    # Set altitude mode
+    altmode = ET.SubElement(linestring, 'altitudeMode')
+    altmode.text = "absolute" if alt_col_name is not None else "clampToGround"
+
+    # Create coordinates string. The loop works on the raw NumPy arrays rather than paying
+    # for a pandas iloc lookup per point.
+    track_arrays = [lon_arr, lat_arr]
+    if alt_arr is not None:
+        track_arrays.append(alt_arr)
+    track_arrays = [arr[keep] for arr in track_arrays]
+
+    # The altitude check is made once here rather than for every point. Without altitude
+    # data the points are written at ground level. A fixed precision format is much cheaper
+    # than the shortest round-trip repr that str() produces for floats. 7 decimal places of
+    # a degree is about 1 cm.
+    coord_format = "%.7f,%.7f,%.2f" if alt_col_name is not None else "%.7f,%.7f,0"
+
+    # The track coordinates are not stored in the tree. A marker is left in their place so
+    # that the (small) rest of the document can be serialized on its own, and the
+    # coordinates are then streamed to the file in batches between the two halves.
+    coordinates = ET.SubElement(linestring, 'coordinates')
+    coordinates.text = COORDS_MARKER
+
+    # Serialize the tree, with pretty print formatting only if requested. The track is the last
+    # element of the document, so it is split at the last occurrence of the marker, in case the
+    # marker text also appears earlier (e.g. in the source filename in the description).
+    kml_head, kml_tail = ET.tostring(kml, encoding='utf-8', xml_declaration=True,
+                                     pretty_print=pretty).rsplit(COORDS_MARKER.encode('utf-8'), 1)
+
+    # Write KML file with XML declaration
+    f.write(kml_head)
+    for start in range(0, len(track_arrays[0]), COORDS_BATCH_SIZE):
+        stop = start + COORDS_BATCH_SIZE
+        # Converting each slice with tolist() gives plain Python scalars in one C-level
+        # pass, which format faster than NumPy scalars yielded one at a time.
+        coords_text = ' '.join(map(coord_format.__mod__,
+                                   zip(*[arr[start:stop].tolist() for arr in track_arrays])))
+        if start > 0:
+            f.write(b' ')
+        # The formatted numbers contain no characters that need XML escaping, so the
+        # text is written to the file as is.
+        f.write(coords_text.encode('ascii'))
+    f.write(kml_tail)
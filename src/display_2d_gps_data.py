@@ -2,13 +2,70 @@
 Module for displaying 2D GPS data from Ethos log files, preprocessed into DataFrames.
 
 This module provides a function to plot GPS tracks on an interactive map using TkinterMapView.
+The map widget keeps the tiles of each map type, so switching between map types does not reload
+tiles that have already been shown.
 """
 
 import os
 import tkinter as tk
 from tkinter import messagebox, ttk
-import pandas as pd
+import numpy as np
 import tkintermapview
+from gps_data import get_gps_arrays
+from utils_numba import rdp_mask
+
+# Size of the map widget, in pixels
+MAP_WIDTH = 990
+MAP_HEIGHT = 600
+
+# Size of the map tiles, in pixels. At zoom level z the world (360 degrees) is 2^z tiles wide.
+TILE_SIZE = 256
+
+# Range of zoom levels used for the initial view of the track
+MIN_ZOOM = 3
+MAX_ZOOM = 19
+
+# Map types offered in the map type selector. Each must have an entry in TILE_SERVERS.
+MAP_TYPES = ("OpenStreetMap", "Google Map", "Google Satellite")
+
+# Tile server URL and maximum zoom level for each map type
+TILE_SERVERS = {
+    "OpenStreetMap": ("https://a.tile.openstreetmap.org/{z}/{x}/{y}.png", 22),
+    "OpenStreetMap DE": ("https://tile.openstreetmap.de/{z}/{x}/{y}.png", 22),
+    "CartoDB": ("https://cartodb-basemaps-a.global.ssl.fastly.net/light_all/{z}/{x}/{y}.png", 22),
+    "OpenTopoMap": ("https://a.tile.opentopomap.org/{z}/{x}/{y}.png", 17),
+    "Google Map": ("https://mt0.google.com/vt/lyrs=m&hl=en&x={x}&y={y}&z={z}&s=Ga", 22),
+    "Google Satellite": ("https://mt0.google.com/vt/lyrs=s&hl=en&x={x}&y={y}&z={z}&s=Ga", 22),
+}
+
+
+class TileCachingMapView(tkintermapview.TkinterMapView):
+    """
+    TkinterMapView that keeps the decoded tiles of every tile server it has used.
+
+    TkinterMapView empties its tile image cache whenever the tile server is changed, so switching
+    back to a map type that was already shown downloads and decodes all of its tiles again. Here
+    the tile_image_cache attribute is redirected to a separate dictionary for each tile server,
+    and the reset done by set_tile_server is ignored, so the tiles are reused.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._tile_caches = {}
+        super().__init__(*args, **kwargs)
+
+    @property
+    def tile_image_cache(self):
+        """
+        The decoded tile images for the current tile server, keyed as in TkinterMapView.
+        """
+        return self._tile_caches.setdefault(getattr(self, 'tile_server', None), {})
+
+    @tile_image_cache.setter
+    def tile_image_cache(self, value):
+        # TkinterMapView only assigns to tile_image_cache to reset it to an empty dictionary,
+        # which is what throws the tiles away, so the assignment is ignored. The cache for a new
+        # tile server is created on first use.
+        pass
 
 
 def display_2d_gps_data(df, filename):
@@ -28,14 +85,9 @@ def display_2d_gps_data(df, filename):
         None
     """
     if 'GPS.Latitude' in df.columns and 'GPS.Longitude' in df.columns:
-        # Convert to numeric in case they are not
-        lat = pd.to_numeric(df['GPS.Latitude'], errors='coerce')
-        lon = pd.to_numeric(df['GPS.Longitude'], errors='coerce')
-
-        # Remove any rows where lat or lon is NaN
-        valid = ~(lat.isna() | lon.isna())
-        lat = lat[valid]
-        lon = lon[valid]
+        # Get the valid GPS coordinates as NumPy arrays, which avoids the pandas overhead on
+        # each of the operations below
+        lat, lon, _ = get_gps_arrays(df)
 
         if len(lat) == 0:
             messagebox.showerror("Error", "No valid GPS coordinates found.")
@@ -50,15 +102,11 @@ def display_2d_gps_data(df, filename):
         lon_range = lon.max() - lon.min()
         max_range = max(lat_range, lon_range)
 
-        # Estimate zoom level (rough approximation)
-        if max_range > 1.0:
-            zoom = 8
-        elif max_range > 0.1:
-            zoom = 12
-        elif max_range > 0.01:
-            zoom = 15
-        else:
-            zoom = 17
+        # Choose the highest zoom level at which the spread of the data fits in the height of
+        # the map (a rough approximation, as it ignores the map projection). Each zoom level
+        # halves the number of degrees covered by a tile.
+        zoom = int(np.clip(np.floor(np.log2(360.0 * MAP_HEIGHT / (TILE_SIZE * max(max_range, 1e-9)))),
+                           MIN_ZOOM, MAX_ZOOM))
 
         # Create the main window
         map_window = tk.Toplevel()
@@ -96,31 +144,18 @@ def display_2d_gps_data(df, filename):
         ttk.Label(control_frame, text="Map Type:").pack(side=tk.LEFT, padx=(20, 5))
         map_type_var = tk.StringVar(value="OpenStreetMap")
         map_type_combo = ttk.Combobox(control_frame, textvariable=map_type_var, 
-                                    values=["OpenStreetMap", "Google Map", "Google Satellite"], 
+                                    values=MAP_TYPES, 
                                     state="readonly", width=18)
         map_type_combo.pack(side=tk.LEFT, padx=2)
         
         def change_map_type(event=None):
             selected = map_type_var.get()
             try:
-                if selected == "OpenStreetMap":
-                    map_widget.set_tile_server("https://a.tile.openstreetmap.org/{z}/{x}/{y}.png", max_zoom=22)
-                elif selected == "OpenStreetMap DE":
-                    map_widget.set_tile_server("https://tile.openstreetmap.de/{z}/{x}/{y}.png", max_zoom=22)
-                elif selected == "CartoDB":
-                    map_widget.set_tile_server("https://cartodb-basemaps-a.global.ssl.fastly.net/light_all/{z}/{x}/{y}.png", max_zoom=22)
-                elif selected == "OpenTopoMap":
-                    map_widget.set_tile_server("https://a.tile.opentopomap.org/{z}/{x}/{y}.png", max_zoom=17)
-                elif selected == "Google Map":
-                    map_widget.set_tile_server("https://mt0.google.com/vt/lyrs=m&hl=en&x={x}&y={y}&z={z}&s=Ga", max_zoom=22)  # google normal
-                elif selected == "Google Satellite":
-                    map_widget.set_tile_server("https://mt0.google.com/vt/lyrs=s&hl=en&x={x}&y={y}&z={z}&s=Ga", max_zoom=22)  # google satellite
-                
-                # Force refresh after changing tile server
-                current_zoom = map_widget.zoom
-                map_widget.set_zoom(current_zoom + 1)
-                map_widget.after(100, lambda: map_widget.set_zoom(current_zoom))
-                
+                tile_server_url, max_zoom = TILE_SERVERS[selected]
+                # set_tile_server redraws the tiles for the current view itself, so there is no
+                # need to change the zoom level and back to refresh the map
+                map_widget.set_tile_server(tile_server_url, max_zoom=max_zoom)
+
             except Exception as e:
                 error_label = ttk.Label(main_frame, text=f"Error changing map type: {str(e)}", foreground="red")
                 error_label.pack(pady=10)
@@ -129,7 +164,8 @@ def display_2d_gps_data(df, filename):
 
     # Create the map widget
         try:
-            map_widget = tkintermapview.TkinterMapView(main_frame, width=990, height=600, corner_radius=0)
+            map_widget = TileCachingMapView(main_frame, width=MAP_WIDTH, height=MAP_HEIGHT,
+                                            corner_radius=0)
             map_widget.pack(fill=tk.BOTH, expand=True)
            
             # Set the first tile server
@@ -144,28 +180,33 @@ def display_2d_gps_data(df, filename):
             error_label = ttk.Label(main_frame, text=f"Error creating map widget: {str(e)}", foreground="red")
             error_label.pack(pady=10)
 
-        # Create path coordinates list
-        path_coordinates = list(zip(lat.tolist(), lon.tolist()))
+        # Create path coordinates list. The track is simplified with the Ramer-Douglas-Peucker
+        # algorithm using a tolerance of 1/1000 of the track extent, which removes points that
+        # would not visibly change the path but slow down the map. The statistics and the
+        # markers use the full arrays.
+        keep = rdp_mask(np.column_stack((lat, lon)), max_range / 1000)
+        lat_path = lat[keep]
+        lon_path = lon[keep]
+        # A single tolist() on the stacked array gives the [lat, lon] pairs that set_path needs,
+        # without building separate Python lists and zipping them together.
+        path_coordinates = np.column_stack((lat_path, lon_path)).tolist()
 
         # Add the GPS track as a path
         if len(path_coordinates) > 1:
             map_widget.set_path(path_coordinates, color="blue", width=3)
 
         # Add start marker (red)
-        start_marker = map_widget.set_marker(lat.iloc[0], lon.iloc[0], 
+        start_marker = map_widget.set_marker(lat[0], lon[0], 
                                            text="Start", 
                                            marker_color_circle="red",
                                            marker_color_outside="darkred")
 
         # Add end marker (green)
-        end_marker = map_widget.set_marker(lat.iloc[-1], lon.iloc[-1], 
+        end_marker = map_widget.set_marker(lat[-1], lon[-1], 
                                          text="End", 
                                          marker_color_circle="green",
                                          marker_color_outside="darkgreen")
 
-        
-        main_frame.mainloop()
-
     else:
         messagebox.showerror(
             "Error", "GPS.Latitude and GPS.Longitude columns are required.")
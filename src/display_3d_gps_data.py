@@ -5,15 +5,18 @@ This module provides a function to plot 3D GPS tracks using matplotlib.
 """
 import os
 from tkinter import messagebox
-import pandas as pd
+import numpy as np
 import matplotlib.pyplot as plt
+from mpl_toolkits.mplot3d.art3d import Line3DCollection
+from gps_data import get_gps_arrays, to_local_meters
+from utils_numba import rdp_mask
 
 def display_3d_gps_data(df, filename):
     """
     Display a 3D plot of GPS data using matplotlib.
 
     This function plots the GPS track from the DataFrame in 3D (longitude, latitude, altitude),
-    showing the path and coloring points by altitude.
+    showing the path colored by altitude. Long tracks are simplified before plotting.
 
     Args:
         df (pd.DataFrame): The DataFrame containing the log data, with 'GPS.Latitude', 
@@ -24,26 +27,38 @@ def display_3d_gps_data(df, filename):
         None
     """
     if all(col in df.columns for col in ['GPS.Latitude', 'GPS.Longitude', 'GPS alt(m)']):
-        lat = pd.to_numeric(df['GPS.Latitude'], errors='coerce')
-        lon = pd.to_numeric(df['GPS.Longitude'], errors='coerce')
-        alt = pd.to_numeric(df['GPS alt(m)'], errors='coerce')
+        # Get the GPS data as NumPy arrays, with any rows where lat, lon, or alt is NaN removed
+        lat, lon, alt = get_gps_arrays(df, 'GPS alt(m)')
 
-        # Remove any rows where lat, lon, or alt is NaN
-        valid = ~(lat.isna() | lon.isna() | alt.isna())
-        lat = lat[valid]
-        lon = lon[valid]
-        alt = alt[valid]
+        # Simplify the track before plotting, dropping points that would not visibly change it.
+        # The tolerance is 1/1000 of the largest extent of the track, computed in approximate
+        # local meters so that the horizontal and vertical distances are in the same units.
+        if len(lat) > 2:
+            track_points = to_local_meters(lat, lon, alt)
+            extent = (track_points.max(axis=0) - track_points.min(axis=0)).max()
+            keep = rdp_mask(track_points, extent / 1000)
+            lat = lat[keep]
+            lon = lon[keep]
+            alt = alt[keep]
 
         fig = plt.figure(figsize=(10, 7))
         ax = fig.add_subplot(111, projection='3d')
-        ax.plot(lon, lat, alt, color='blue', label='Path')
-        ax.scatter(lon, lat, alt, c=alt, cmap='viridis', s=20)
+
+        # Draw the path as a single collection of line segments, each colored by the altitude at
+        # its start, rather than a line plus a separate marker for every point.
+        if len(lat) > 1:
+            points = np.column_stack((lon, lat, alt))
+            segments = np.stack((points[:-1], points[1:]), axis=1)
+            path = Line3DCollection(segments, cmap='viridis', array=alt[:-1], linewidths=2,
+                                    label='Path')
+            ax.add_collection3d(path)
+            ax.auto_scale_xyz(lon, lat, alt)
+            plt.legend()
 
         ax.set_title(f"3D GPS Data - {os.path.basename(filename)}")
         ax.set_xlabel('Longitude')
         ax.set_ylabel('Latitude')
         ax.set_zlabel('Altitude (m)')
-        plt.legend()
         plt.tight_layout()
         plt.show()
     else:
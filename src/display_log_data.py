@@ -12,10 +12,15 @@ Functions:
 import os
 import tkinter as tk
 from tkinter import messagebox
-import pandas as pd
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+import numpy as np
 import matplotlib.pyplot as plt
 
+# Image for the one y-axis toolbar button. It is loaded by the first log data window, once a Tk
+# root window exists, and then shared by later windows.
+ONE_Y_AXIS_IMAGE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "one_y_axis.png")
+_one_y_axis_image = None
+
 def display_log_data(df, filename):
     """
     Display an interactive plot window for selected log columns.
@@ -31,6 +36,8 @@ def display_log_data(df, filename):
     Returns:
         None
     """
+    global _one_y_axis_image
+
     # Variable to control axis mode
     use_one_y_axis = tk.BooleanVar(value=False)
 
@@ -75,102 +82,166 @@ def display_log_data(df, filename):
 
     # Add navigation toolbar
     toolbar = NavigationToolbar2Tk(canvas, plot_frame)
-    
-    toolbar.update()
     toolbar.pack(side=tk.TOP, fill=tk.X)
 
-    ax2 = ax.twinx()  # For two y-axes if needed
-    ax3 = ax.twinx()  # For three y-axes if needed
-
+    # The data does not change while the window is open, so the arrays to plot and the statistics
+    # text are prepared once here rather than every time the plot is updated.
+    x_arr = df['ElapsedTime'].to_numpy()
+    # The numeric columns are found with a single dtype scan of the DataFrame. Boolean columns
+    # are included, as they are numeric for plotting purposes. They are listed alphabetically.
+    numeric_cols = sorted(col for col in df.select_dtypes(include=['number', 'bool']).columns
+                          if col != 'ElapsedTime')
+    col_arrays = {col: df[col].to_numpy() for col in numeric_cols}
+
+    stats_text = ""
+    stats_text += f"Date: {df['Date'].iloc[0]}\n"
+    stats_text += f"T0: {df['Time'].iloc[0]}\n"
+    stats_text += f"Duration: {x_arr[-1] - x_arr[0]:.1f}s"
+
+    # Lines are created as they are needed, then updated with set_data and reused for later
+    # updates of the plot, rather than clearing the axes and plotting everything again each time.
+    axis_lines = {ax: []}
+    colors = ['tab:blue', 'tab:orange', 'tab:green', 'tab:red', 'tab:purple']
+    default_label_color = plt.rcParams['axes.labelcolor']
+    default_tick_color = plt.rcParams['ytick.color']
+
+    def show_lines(axis, cols, first_color):
+        """
+        Plots the given columns on an axis, reusing its existing lines, and hides its other lines.
 
-    def update_plot(*args):
-        ax.clear()
-        ax2.clear()
-        ax3.clear()
+        Returns the list of lines that are shown.
+        """
+        n_existing = len(axis_lines[axis])
+        if len(cols) > n_existing:
+            # Any new lines that are needed are created together, with a single plot call
+            # using one column of the stacked data for each line
+            new_data = np.column_stack([col_arrays[col] for col in cols[n_existing:]])
+            axis_lines[axis].extend(axis.plot(x_arr, new_data))
+
+        for i, col in enumerate(cols):
+            line = axis_lines[axis][i]
+            if i < n_existing:
+                line.set_data(x_arr, col_arrays[col])
+            line.set_label(col)
+            line.set_color(colors[(first_color + i) % len(colors)])
+            line.set_visible(True)
+
+        for line in axis_lines[axis][len(cols):]:
+            line.set_visible(False)
+
+        axis.relim(visible_only=True)
+        axis.autoscale_view()
+        return axis_lines[axis][:len(cols)]
+
+    # Plot settings and text that do not change
+    ax.set_xlabel("Elapsed Time (seconds)", fontsize=12)
+    ax.grid(True, alpha=0.3)
+    ax.set_title(f"Log File: {os.path.basename(filename)}",
+                        fontsize=14, fontweight='bold')
+
+    no_data_text = ax.text(0.5, 0.5, 'Select data columns to plot\nusing checkboxes on the left',
+                           horizontalalignment='center', verticalalignment='center',
+                           transform=ax.transAxes, fontsize=14,
+                           bbox=dict(boxstyle='round', facecolor='lightgray', alpha=0.8))
+
+    # Data statistics
+    ax.text(0.02, 0.98, stats_text, transform=ax.transAxes,
+                    fontsize=10, verticalalignment='top',
+                    bbox=dict(boxstyle='round', facecolor='lightblue', alpha=0.8))
+
+    # The second and third y-axes are only created when they are first needed, and are hidden
+    # when not in use, so that a plot with a single y-axis does not have to draw them.
+    twin_axes = []
+
+    def get_twin_axis(i):
+        """
+        Returns the i'th additional y-axis (1 or 2), creating the axes as needed.
 
-        ax.yaxis.set_visible(True)
-        ax2.axis('off')
-        ax3.axis('off')
+        The layout and colors of each axis are set up once here, as the i'th axis always shows
+        the i'th selected column in the same color.
+        """
+        while len(twin_axes) < i:
+            twin = ax.twinx()
+            color = colors[len(twin_axes) + 1]
+            twin.yaxis.set_label_position('right')
+            twin.yaxis.label.set_color(color)
+            twin.tick_params(axis='y', labelcolor=color)
+            if len(twin_axes) == 1:
+                # Move the third y-axis out so that it does not overlap the second one
+                twin.spines['right'].set_position(('outward', 60))
+            axis_lines[twin] = []
+            twin_axes.append(twin)
+        return twin_axes[i - 1]
 
-        selected_cols = [col for col, (var, trace_id) in col_vars.items() if var.get()]
-        colors = ['tab:blue', 'tab:orange', 'tab:green', 'tab:red', 'tab:purple']
+    def update_plot(*args):
+        selected_cols = [col for col, var in col_vars.items() if var.get()]
 
-        if len(selected_cols) == 0:
-            ax.text(0.5, 0.5, 'Select data columns to plot\nusing checkboxes on the left',
-                            horizontalalignment='center', verticalalignment='center',
-                            transform=ax.transAxes, fontsize=14,
-                            bbox=dict(boxstyle='round', facecolor='lightgray', alpha=0.8))
-            ax.set_title(f"Log File: {os.path.basename(filename)}",
-                                fontsize=14, fontweight='bold')
+        no_data_text.set_visible(len(selected_cols) == 0)
 
+        if use_one_y_axis.get() or len(selected_cols) > 3:
+            # Plot all on one axis
+            lines = show_lines(ax, selected_cols, 0)
+            ax.set_ylabel('Value', color=default_label_color)
+            ax.tick_params(axis='y', labelcolor=default_tick_color)
+            twins_used = 0
         else:
-            if use_one_y_axis.get() or len(selected_cols) > 3:
-                # Plot all on one axis
-                for i, col in enumerate(selected_cols):
-                    ax.plot(df['ElapsedTime'], df[col], label=col, color=colors[i % len(colors)])
-                ax.set_xlabel('ElapsedTime (s)')
-                ax.set_ylabel('Value')
-                ax.legend(loc='upper right')
+            # Up to 3 y-axes, with one column on each
+            lines = show_lines(ax, selected_cols[0:1], 0)
+            if len(selected_cols) >= 1:
+                ax.set_ylabel(selected_cols[0], color=colors[0])
+                ax.tick_params(axis='y', labelcolor=colors[0])
             else:
-                # Up to 3 y-axes
-                if len(selected_cols) >= 1:
-                    lines = ax.plot(df['ElapsedTime'], df[selected_cols[0]],
-                                    label=selected_cols[0], color=colors[0])
-                    ax.set_xlabel('ElapsedTime (s)')
-                    ax.set_ylabel(selected_cols[0], color=colors[0])
-                    ax.tick_params(axis='y', labelcolor=colors[0])
-
-                if len(selected_cols) >= 2:
-                    ax2.axis('on')
-                    ax2.yaxis.set_visible(True)
-                    line2 = ax2.plot(df['ElapsedTime'], df[selected_cols[1]],
-                                     label=selected_cols[1], color=colors[1])
-                    ax2.set_ylabel(selected_cols[1], color=colors[1])
-                    ax2.tick_params(axis='y', labelcolor=colors[1])
-                    ax2.yaxis.set_label_position('right')
-                    lines = lines + line2
-
-                if len(selected_cols) >= 3:
-                    ax3.axis('on')
-                    ax3.yaxis.set_visible(True)
-                    ax3.spines['right'].set_position(('outward', 60))
-                    lines3 = ax3.plot(df['ElapsedTime'], df[selected_cols[2]],
-                                      label=selected_cols[2], color=colors[2])
-                    ax3.set_ylabel(selected_cols[2], color=colors[2])
-                    ax3.tick_params(axis='y', labelcolor=colors[2])
-                    ax3.yaxis.set_label_position('right')
-                    lines = lines + lines3
-
-                labels = [l.get_label() for l in lines]
-                ax.legend(lines, labels, loc='upper right')
-
-        # Common plot settings
-        ax.set_xlabel("Elapsed Time (seconds)", fontsize=12)
-        ax.grid(True, alpha=0.3)
-        ax.set_title(f"Log File: {os.path.basename(filename)}",
-                            fontsize=14, fontweight='bold')
-
-        # Data statistics
-        stats_text = ""
-        stats_text += f"Date: {df['Date'].iloc[0]}\n"
-        stats_text += f"T0: {df['Time'].iloc[0]}\n"
-        stats_text += f"Duration: {df['ElapsedTime'].iloc[-1] - df['ElapsedTime'].iloc[0]:.1f}s"
-        ax.text(0.02, 0.98, stats_text, transform=ax.transAxes,
-                        fontsize=10, verticalalignment='top',
-                        bbox=dict(boxstyle='round', facecolor='lightblue', alpha=0.8))
-
-        canvas.draw()
+                ax.set_ylabel('', color=default_label_color)
+                ax.tick_params(axis='y', labelcolor=default_tick_color)
+
+            twins_used = len(selected_cols[1:])
+            for i, col in enumerate(selected_cols[1:], start=1):
+                twin = get_twin_axis(i)
+                twin.set_visible(True)
+                lines += show_lines(twin, [col], i)
+                twin.set_ylabel(col)
+
+        for twin in twin_axes[twins_used:]:
+            show_lines(twin, [], 0)
+            twin.set_visible(False)
+
+        if lines:
+            labels = [l.get_label() for l in lines]
+            ax.legend(lines, labels, loc='upper right')
+        elif ax.get_legend() is not None:
+            ax.get_legend().remove()
+
+        canvas.draw_idle()
+
+    # Plot updates are run when Tk is next idle, rather than straight away, so that several
+    # changes made together (e.g. by set_all) only update the plot once.
+    update_pending = [False]
+
+    def request_update(*args):
+        """
+        Schedules an update of the plot, unless one is already pending.
+        """
+        if update_pending[0]:
+            return
+        update_pending[0] = True
+        win.after_idle(run_update)
+
+    def run_update():
+        """
+        Runs the pending update of the plot.
+        """
+        update_pending[0] = False
+        update_plot()
 
     # Variables for checkboxes
     col_vars = {}
 
-    for col in df.columns:
-        if col != 'ElapsedTime' and pd.api.types.is_numeric_dtype(df[col]):
-            var = tk.BooleanVar()
-            trace_id = var.trace_add('write', update_plot)
-            cb = tk.Checkbutton(checkbox_frame, text=col, variable=var)
-            cb.pack(anchor='w')
-            col_vars[col] = var,trace_id
+    for col in col_arrays:
+        var = tk.BooleanVar()
+        var.trace_add('write', request_update)
+        cb = tk.Checkbutton(checkbox_frame, text=col, variable=var)
+        cb.pack(anchor='w')
+        col_vars[col] = var
 
 
     def set_all():
@@ -178,32 +249,20 @@ def display_log_data(df, filename):
         Selects all available data columns for plotting.
 
         This function sets all checkboxes to True, enabling all numeric columns for display
-        in the plot window. In order to avoid updating the plot too frequently, the trace
-        is temporarily removed while the variables are updated.
+        in the plot window. The plot is updated once, after all of the variables are changed.
         """
-        for col, (var, trace_id) in col_vars.items():
-            var.trace_remove('write', trace_id)
+        for var in col_vars.values():
             var.set(True)
-            new_trace_id = var.trace_add('write', update_plot)
-            col_vars[col] = var, new_trace_id
-
-        update_plot()
 
     def clear_all():
         """
         Clears all selected data columns.
 
         This function sets all checkboxes to False, clearing the display off all data series
-        in the plot window. In order to avoid updating the plot too frequently, the trace
-        is temporarily removed while the variables are updated.
+        in the plot window. The plot is updated once, after all of the variables are changed.
         """
-        for col, (var, trace_id) in col_vars.items():
-            var.trace_remove('write', trace_id)
+        for var in col_vars.values():
             var.set(False)
-            new_trace_id = var.trace_add('write', update_plot)
-            col_vars[col] = var, new_trace_id
-
-        update_plot()
 
     def toggle_one_y_axis():
         """
@@ -216,7 +275,7 @@ def display_log_data(df, filename):
         one_y_axis_button.config(relief=tk.SUNKEN if use_one_y_axis.get() else tk.FLAT)
         one_y_axis_button.config(bg="white" if use_one_y_axis.get() else btn_frame.cget("background"))
 
-        update_plot()
+        request_update()
 
     btn_frame = tk.Frame(checkbox_frame)
     btn_frame.pack(pady=10, fill=tk.X)
@@ -232,9 +291,9 @@ def display_log_data(df, filename):
     separator.pack(side=tk.LEFT, padx='3p')
 
     # Then, create the one_y_axis_button
-    one_y_axis_image = tk.PhotoImage(file="src/one_y_axis.png")
-    one_y_axis_button = tk.Button(master=toolbar, image=one_y_axis_image, relief = tk.FLAT, overrelief=tk.SUNKEN, borderwidth=1, command=toggle_one_y_axis)
-    one_y_axis_button.image = one_y_axis_image  # Keep a reference to avoid garbage collection
+    if _one_y_axis_image is None or _one_y_axis_image.tk is not win.tk:
+        _one_y_axis_image = tk.PhotoImage(file=ONE_Y_AXIS_IMAGE_FILE)
+    one_y_axis_button = tk.Button(master=toolbar, image=_one_y_axis_image, relief = tk.FLAT, overrelief=tk.SUNKEN, borderwidth=1, command=toggle_one_y_axis)
     one_y_axis_button.pack(side="left")
 
     toolbar.update()
@@ -3,6 +3,7 @@ Module for exporting processed Ethos log DataFrames to CSV files.
 
 Functions:
     export_processed_log_file(df, original_filename): Prompts the user to select a location and filename for saving the processed log data.
+    write_csv(df, filename, columns): Writes the DataFrame to a CSV file in chunks.
 """
 
 import os
@@ -10,11 +11,15 @@ from tkinter.filedialog import asksaveasfilename
 from tkinter import messagebox
 import pandas as pd
 
+# Number of rows written at a time by the CSV writer
+CSV_CHUNK_SIZE = 100_000
+
 def export_processed_log_file(df, original_filename):
     """
     Export the processed DataFrame to a new CSV file.
 
-    Prompts the user to select a location and filename for saving the processed log data.
+    Prompts the user to select a location and filename for saving the processed log data. The
+    columns are written in alphabetical order.
 
     Args:
         df (pd.DataFrame): The processed DataFrame to export.
@@ -27,5 +32,25 @@ def export_processed_log_file(df, original_filename):
                                       initialfile=f"processed_{os.path.basename(original_filename)}",
                                       filetypes=[("CSV files", "*.csv")])
     if save_filename:
-        df.to_csv(save_filename, index=False)
-        messagebox.showinfo("Export Complete", f"Processed log file saved to:\n{save_filename}")
\ No newline at end of file
+        write_csv(df, save_filename, columns=sorted(df.columns))
+        messagebox.showinfo("Export Complete", f"Processed log file saved to:\n{save_filename}")
+
+
+def write_csv(df, filename, columns=None):
+    """
+    Write the DataFrame to a CSV file, without the index.
+
+    The rows are written in chunks to limit the memory used. The pandas writer is used rather
+    than pyarrow's faster one, as pyarrow formats the file differently (e.g. it quotes all text
+    and writes booleans and dates in other formats), which would change the exported files.
+
+    Args:
+        df (pd.DataFrame): The DataFrame to write.
+        filename (str): The name of the CSV file to create.
+        columns (list, optional): The columns to write, in order. By default all of the columns
+            are written in the order of the DataFrame.
+
+    Returns:
+        None
+    """
+    df.to_csv(filename, index=False, columns=columns, chunksize=CSV_CHUNK_SIZE)
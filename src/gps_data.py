@@ -0,0 +1,118 @@
+"""
+Module for extracting validated GPS data from Ethos log DataFrames.
+
+The GPS columns are converted to float NumPy arrays and rows with missing values are removed. The
+result is cached per DataFrame, so that displaying the 2D map and creating KML files for the same
+log only pays for the conversion once.
+
+Functions:
+    get_gps_arrays(df, alt_col_name): Return the valid latitude, longitude and altitude arrays.
+    to_local_meters(lat, lon, alt): Convert GPS coordinates to approximate local coordinates in
+        meters.
+"""
+
+import math
+import weakref
+import numpy as np
+import pandas as pd
+
+# Approximate length of one degree of latitude, in meters
+METERS_PER_DEGREE = 111320.0
+
+# Cache of validated GPS arrays, keyed by (id(df), alt_col_name). Each entry also holds a weak
+# reference to the DataFrame, and is removed when that DataFrame is garbage collected.
+_gps_arrays_cache = {}
+
+
+def _column_to_float(column):
+    """
+    Convert a DataFrame column to a float NumPy array, with non-numeric values set to NaN.
+
+    Columns that already hold NumPy floats are returned without a copy, and other numeric
+    columns are cast directly, skipping the parsing done by pd.to_numeric.
+
+    Args:
+        column (pd.Series): The column to convert.
+
+    Returns:
+        np.ndarray: The column values as floats.
+    """
+    if isinstance(column.dtype, np.dtype) and np.issubdtype(column.dtype, np.floating):
+        return column.to_numpy(copy=False)
+    if pd.api.types.is_numeric_dtype(column.dtype):
+        return column.to_numpy(dtype=float, na_value=np.nan)
+    return pd.to_numeric(column, errors='coerce').to_numpy(dtype=float, copy=False)
+
+
+def get_gps_arrays(df, alt_col_name=None):
+    """
+    Return the GPS data from the DataFrame as float NumPy arrays, with invalid rows removed.
+
+    The 'GPS.Latitude' and 'GPS.Longitude' columns (and the altitude column, if given) are
+    converted to numbers, and any row where one of them is missing, infinite or not numeric is
+    dropped. The result is cached, so later calls for the same DataFrame and altitude column
+    return the same arrays. The arrays are read-only as they are shared between callers.
+
+    Args:
+        df (pd.DataFrame): The DataFrame containing the log data, with 'GPS.Latitude' and
+            'GPS.Longitude' columns.
+        alt_col_name (str, optional): The name of the altitude column to include, or None.
+
+    Returns:
+        tuple: (lat, lon, alt)
+            lat (np.ndarray): Latitudes of the valid rows.
+            lon (np.ndarray): Longitudes of the valid rows.
+            alt (np.ndarray): Altitudes of the valid rows, or None if alt_col_name is None.
+    """
+    key = (id(df), alt_col_name)
+    entry = _gps_arrays_cache.get(key)
+    if entry is not None and entry[0]() is df:
+        return entry[1]
+
+    columns = ['GPS.Latitude', 'GPS.Longitude']
+    if alt_col_name is not None:
+        columns.append(alt_col_name)
+
+    arrays = [_column_to_float(df[col]) for col in columns]
+
+    # Remove any rows where one of the values is NaN (or infinite), using a single mask for all
+    # of the columns. If every row is valid the arrays are used as they are.
+    valid = np.logical_and.reduce([np.isfinite(arr) for arr in arrays])
+    if not valid.all():
+        arrays = [arr[valid] for arr in arrays]
+
+    # Views are made read-only, so that the arrays of the DataFrame itself are not affected
+    arrays = [arr.view() for arr in arrays]
+    for arr in arrays:
+        arr.flags.writeable = False
+    if alt_col_name is None:
+        arrays.append(None)
+    gps_arrays = tuple(arrays)
+
+    _gps_arrays_cache[key] = (
+        weakref.ref(df, lambda ref: _gps_arrays_cache.pop(key, None)), gps_arrays)
+    return gps_arrays
+
+
+def to_local_meters(lat, lon, alt=None):
+    """
+    Convert GPS coordinates to approximate local coordinates in meters.
+
+    The coordinates are offsets from the first point, using a flat earth approximation that is
+    accurate enough over the distances covered by a typical flight. This puts the horizontal
+    coordinates in the same units as the altitude, e.g. for track simplification.
+
+    Args:
+        lat (np.ndarray): Latitudes, in degrees.
+        lon (np.ndarray): Longitudes, in degrees.
+        alt (np.ndarray, optional): Altitudes, in meters.
+
+    Returns:
+        np.ndarray: Array of shape (N, 2), or (N, 3) if alt is given, with the east and north
+            offsets (and the altitude) of each point in meters.
+    """
+    columns = [(lon - lon[0]) * math.cos(math.radians(lat[0])) * METERS_PER_DEGREE,
+               (lat - lat[0]) * METERS_PER_DEGREE]
+    if alt is not None:
+        columns.append(alt)
+    return np.column_stack(columns)
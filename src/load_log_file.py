@@ -5,19 +5,297 @@ This module provides a function to prompt the user to select a CSV file, import
 DataFrame, and perform preprocessing steps on the data.
 
 Functions:
-    load_log_file(): Prompts the user to select a CSV file, loads and preprocesses it, and 
+    load_log_file(root): Prompts the user to select a CSV file, loads and preprocesses it, and 
     returns the DataFrame and filename.
+    read_csv_file(filename): Reads a CSV file into a DataFrame, using pyarrow if it is installed.
+    read_log_polars(filename): Reads a CSV log file and splits its 'GPS' column using polars.
+    split_gps_column(df): Splits the 'GPS' column into 'GPS.Latitude' and 'GPS.Longitude' columns.
+    read_cached_log(filename): Reads the preprocessed log from its cache file, if it is up to date.
+    write_cached_log(filename, df, import_status): Writes the preprocessed log to its cache file.
 """
 
+import os
+import importlib.util
+import math
 from tkinter import Tk
 from tkinter.filedialog import askopenfilename
 from datetime import datetime
 import re
+from functools import lru_cache
+import numpy as np
 import pandas as pd
-from pyproj import Proj
 
+# The optional packages used here (pyarrow, polars and pyproj) are only imported by the functions
+# that use them, so that importing this module at startup does not pay for them.
 
-def load_log_file():
+# Columns of Ethos log files that hold text. They are always read as strings, so that pyarrow
+# does not convert the dates and times to other types, and so that every chunk of a large file
+# gives them the same type.
+TEXT_COLUMNS = ('Date', 'Time', 'DateTime', 'GPS', 'GPS clock()')
+
+# Format of the combined Date and Time columns of Ethos log files
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+# Format of the Time column, HH:MM:SS.f (with one or more "f" digits)
+TIME_PATTERN = re.compile(r'^\d{1,2}:\d{2}:\d{2}\.\d+$')
+
+# Names of the LiPo cell voltage columns, e.g. 'LiPo1(V)'
+LIPO_COLUMN_PATTERN = re.compile(r"LiPo\d+\(V\)")
+
+# Logs with fewer valid GPS points than this, or whose GPS points span less than
+# SMALL_GPS_SPREAD_DEG degrees (latitude plus longitude range), are projected with an
+# equirectangular approximation instead of pyproj. Over such short distances the difference is
+# negligible, and it avoids the cost of importing pyproj and setting up the projection.
+SMALL_GPS_POINT_COUNT = 64
+SMALL_GPS_SPREAD_DEG = 1e-4
+
+# WGS84 equatorial radius, in meters
+EARTH_RADIUS_M = 6378137.0
+
+# The preprocessed log is saved in a Parquet file next to the CSV file (with this suffix added to
+# its name), and loaded from there the next time if the CSV file has not changed since. This
+# needs pyarrow, and can be turned off by setting the CACHE_DISABLE_ENV_VAR environment variable.
+# CACHE_VERSION must be changed whenever the preprocessing changes, so that old cache files are
+# not used.
+CACHE_SUFFIX = '.parquet'
+CACHE_VERSION = b'1'
+CACHE_DISABLE_ENV_VAR = 'ETHOS_LOG_ANALYZER_NO_CACHE'
+
+# Files larger than this (in bytes) are read in chunks of CSV_CHUNK_ROWS rows, to limit the memory
+# used while loading them
+CHUNKED_READ_MIN_SIZE = 200 * 1024 * 1024
+CSV_CHUNK_ROWS = 1_000_000
+
+
+@lru_cache(maxsize=32)
+def _aeqd_projection(lat0, lon0):
+    """
+    Returns a pyproj azimuthal equidistant projection (WGS84) centered on (lat0, lon0).
+
+    The projections are cached, so loading several logs from the same flying site only sets up
+    the projection once. pyproj is only imported when a projection is first needed.
+
+    Args:
+        lat0 (float): Latitude of the center of the projection, in degrees.
+        lon0 (float): Longitude of the center of the projection, in degrees.
+
+    Returns:
+        pyproj.Proj: The projection.
+    """
+    from pyproj import Proj
+    return Proj(proj='aeqd', lat_0=lat0, lon_0=lon0, datum='WGS84')
+
+
+def _as_text(series):
+    """
+    Returns a column as text, converting it with astype(str) only if it doesn't already hold
+    strings. Columns with a string dtype, and object columns whose values are all str, are
+    returned as they are, without copying them.
+
+    Args:
+        series (pd.Series): The column.
+
+    Returns:
+        pd.Series: The column as text.
+    """
+    if isinstance(series.dtype, pd.StringDtype):
+        return series
+    if (pd.api.types.is_string_dtype(series.dtype) and
+            pd.api.types.infer_dtype(series, skipna=False) == 'string'):
+        return series
+    return series.astype(str)
+
+
+def read_csv_file(filename):
+    """
+    Reads a CSV file into a pandas DataFrame, using pyarrow's multithreaded CSV parser if it is
+    installed.
+
+    The columns are given the same names and types that pd.read_csv would give them, so the
+    preprocessing does not depend on which parser was used. If pyarrow is not installed, or
+    cannot read the file, pd.read_csv is used.
+
+    Args:
+        filename (str): The path to the CSV file.
+
+    Returns:
+        pd.DataFrame: The data from the file.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.csv as pa_csv
+    except ImportError:
+        pa = None
+
+    if pa is not None:
+        try:
+            convert_options = pa_csv.ConvertOptions(
+                column_types={col: pa.string() for col in TEXT_COLUMNS},
+                strings_can_be_null=True)
+            table = pa_csv.read_csv(filename, convert_options=convert_options)
+        except pa.ArrowException:
+            table = None
+
+        # pd.read_csv renames duplicate columns, so leave files that have them to pandas
+        if table is not None and len(set(table.column_names)) == table.num_columns:
+            for i, field in enumerate(table.schema):
+                # Any other columns that were read as dates or times are converted back to text
+                if pa.types.is_temporal(field.type):
+                    table = table.set_column(i, field.name, table.column(i).cast(pa.string()))
+            # Name columns without a header the same way as pandas
+            names = [name if name else f"Unnamed: {i}" for i, name in enumerate(table.column_names)]
+            return table.rename_columns(names).to_pandas()
+
+    return pd.read_csv(filename)
+
+
+def read_log_polars(filename):
+    """
+    Reads a CSV log file with polars, and splits its 'GPS' column into numeric 'GPS.Latitude' and
+    'GPS.Longitude' columns in the same query, before converting the result to a pandas DataFrame.
+
+    polars reads and parses the file with multiple threads, and its streaming engine processes
+    large files in batches, so the full GPS text is never held in memory. The result has the same
+    columns and types as reading the file with read_csv_file and then calling split_gps_column
+    (apart from columns with no values, which are removed later anyway).
+
+    Args:
+        filename (str): The path to the CSV file.
+
+    Returns:
+        pd.DataFrame: The data from the file, or None if polars (or pyarrow, which it uses for the
+            conversion to pandas) is not installed, polars fails to read the file (e.g. it is
+            too old for the functions used here), or the file has duplicate column names. The
+            pandas path is then used.
+    """
+    if (importlib.util.find_spec('polars') is None or
+            importlib.util.find_spec('pyarrow') is None):
+        return None
+    import polars as pl
+
+    try:
+        lf = pl.scan_csv(filename, schema_overrides={col: pl.String for col in TEXT_COLUMNS},
+                         infer_schema_length=None)
+        names = lf.collect_schema().names()
+        # polars renames duplicate columns differently from pd.read_csv, so leave files that have
+        # them to pandas
+        if any('_duplicated_' in name for name in names):
+            return None
+        # Name columns without a header the same way as pandas
+        lf = lf.rename({name: f"Unnamed: {i}" for i, name in enumerate(names) if not name})
+        if 'GPS' in names:
+            parts = pl.col('GPS').str.extract_groups(r'^(?P<lat>\S+)\s+(?P<lon>\S+)')
+            lf = lf.with_columns(
+                parts.struct.field('lat').cast(pl.Float64, strict=False).alias('GPS.Latitude'),
+                parts.struct.field('lon').cast(pl.Float64, strict=False).alias('GPS.Longitude'),
+            ).drop('GPS')
+        return lf.collect(engine='streaming').to_pandas()
+    except Exception:
+        # Any failure, including an older polars without the functions used here, falls back to
+        # the pandas path
+        return None
+
+
+def split_gps_column(df):
+    """
+    Splits the 'GPS' column, which holds "latitude longitude" text, into numeric 'GPS.Latitude'
+    and 'GPS.Longitude' columns. Values that are not numbers are set to NaN.
+
+    If the 'GPS' column is empty it is simply removed, and if there is no 'GPS' column the
+    DataFrame is returned unchanged.
+
+    Args:
+        df (pd.DataFrame): The DataFrame with the log data.
+
+    Returns:
+        pd.DataFrame: The DataFrame with the 'GPS' column replaced.
+    """
+    if 'GPS' in df.columns:
+        if df['GPS'].notna().any():
+            # Extract the two fields with a single regular expression, and convert them straight
+            # to floats rather than keeping them as text
+            parts = df['GPS'].str.extract(r'^(?P<lat>\S+)\s+(?P<lon>\S+)')
+            df['GPS.Latitude'] = pd.to_numeric(parts['lat'], errors='coerce')
+            df['GPS.Longitude'] = pd.to_numeric(parts['lon'], errors='coerce')
+        df = df.drop(columns=['GPS'])
+    return df
+
+
+def read_cached_log(filename):
+    """
+    Reads the preprocessed log data for a CSV file from its cache file.
+
+    Args:
+        filename (str): The path to the CSV log file.
+
+    Returns:
+        tuple: (df, import_status), or None if there is no usable cache file (caching is turned
+            off, pyarrow is not installed, the cache file is missing, older than the CSV file,
+            from a different version of the preprocessing, or can't be read).
+    """
+    if os.environ.get(CACHE_DISABLE_ENV_VAR):
+        return None
+
+    cache_filename = filename + CACHE_SUFFIX
+    try:
+        if os.path.getmtime(cache_filename) < os.path.getmtime(filename):
+            return None
+    except OSError:
+        return None
+
+    # pyarrow is only imported once there is a cache file to read
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pa_parquet
+    except ImportError:
+        return None
+
+    try:
+        table = pa_parquet.read_table(cache_filename)
+    except (OSError, pa.ArrowException):
+        return None
+
+    metadata = table.schema.metadata or {}
+    if metadata.get(b'ethos_cache_version') != CACHE_VERSION:
+        return None
+    return table.to_pandas(), metadata.get(b'ethos_import_status', b'').decode()
+
+
+def write_cached_log(filename, df, import_status):
+    """
+    Writes the preprocessed log data for a CSV file to its cache file, if caching is enabled.
+
+    Failing to write the cache file (e.g. if the folder is read-only) is not an error, as the
+    CSV file will simply be loaded again next time.
+
+    Args:
+        filename (str): The path to the CSV log file.
+        df (pd.DataFrame): The preprocessed log data.
+        import_status (str): The import status message for the log.
+
+    Returns:
+        None
+    """
+    if os.environ.get(CACHE_DISABLE_ENV_VAR):
+        return
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pa_parquet
+    except ImportError:
+        return
+
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        metadata = dict(table.schema.metadata or {})
+        metadata[b'ethos_cache_version'] = CACHE_VERSION
+        metadata[b'ethos_import_status'] = import_status.encode()
+        table = table.replace_schema_metadata(metadata)
+        pa_parquet.write_table(table, filename + CACHE_SUFFIX, compression='zstd')
+    except (OSError, pa.ArrowException, ValueError, TypeError) as e:
+        print(f"Warning: unable to write cache file for '{filename}': {e}")
+
+
+def load_log_file(root=None):
     """
     Prompts the user to select a CSV log file, loads it into a pandas DataFrame, and preprocesses 
     the data.
@@ -32,7 +310,13 @@ def load_log_file():
         pyproj (WGS84)
     - Computing 'Power (W)' if 'VFAS(V)' and 'Current(A)' columns are present
     - Summing all 'LiPoN (V)' columns into 'LiPo Total (V)' if present
-    - Sorting columns alphabetically
+
+    The preprocessed data is cached in a Parquet file next to the CSV file, and later loads of the
+    same (unchanged) file use the cache instead of repeating the preprocessing.
+
+    Args:
+        root (tk.Tk, optional): The application's Tk root window, used for the file dialog. If it
+            is not given, a hidden root window is created.
 
     Returns:
         tuple: (df, filename)
@@ -42,38 +326,72 @@ def load_log_file():
     Raises:
         FileNotFoundError: If no file is selected.
     """
-    Tk().withdraw()  # Prevents the root window from appearing
+    if root is None:
+        root = Tk()
+        root.withdraw()  # Prevents the root window from appearing
     filename = askopenfilename(filetypes=[("CSV files", "*.csv")])
 
     import_status=""
 
     if filename:
-        df = pd.read_csv(filename)
+        # Use the preprocessed data from the last time the file was loaded, if the file hasn't
+        # changed since
+        cached = read_cached_log(filename)
+        if cached is not None:
+            df, import_status = cached
+            print(f"File '{filename}' imported from cache.")
+            return df, filename, import_status + "Loaded from cache.\n"
+
+        # Split GPS column if present. If polars is installed the file is read and the GPS column
+        # split by polars. Otherwise, for large files this is done for each chunk as it is read,
+        # so that only one chunk of the GPS text is held in memory at a time.
+        df = read_log_polars(filename)
+        if df is None:
+            if os.path.getsize(filename) > CHUNKED_READ_MIN_SIZE:
+                chunks = pd.read_csv(filename, chunksize=CSV_CHUNK_ROWS,
+                                     dtype={col: str for col in TEXT_COLUMNS})
+                df = pd.concat([split_gps_column(chunk) for chunk in chunks], ignore_index=True)
+            else:
+                df = split_gps_column(read_csv_file(filename))
 
-        # Remove empty columns
-        df = df.dropna(axis=1, how='all')
+        # Remove empty columns, found with a single mask of the columns that have any values
+        nonempty = df.notna().any(axis=0)
+        df = df.drop(columns=df.columns[~nonempty.to_numpy()])
 
-        # Split GPS column if present
-        if 'GPS' in df.columns:
-            gps_split = df['GPS'].str.split(' ', expand=True)
-            df['GPS.Latitude'] = gps_split[0]
-            df['GPS.Longitude'] = gps_split[1]
-            df = df.drop(columns=['GPS'])
+        # The derived columns are collected here and added to the DataFrame together at the end,
+        # rather than one at a time
+        derived = {}
 
         # Compute X/Y excursions in meters from center GPS point if GPS columns exist
         if 'GPS.Longitude' in df.columns and 'GPS.Latitude' in df.columns:
-            # Convert to float in case they are strings
-            df['GPS.LongitudeFloat'] = df['GPS.Longitude'].astype(float)
-            df['GPS.LatitudeFloat'] = df['GPS.Latitude'].astype(float)
-            lon0 = df['GPS.LongitudeFloat'].mean()
-            lat0 = df['GPS.LatitudeFloat'].mean()
-            # Use pyproj for accurate projection (WGS84)
-            proj = Proj(proj='aeqd', lat_0=lat0, lon_0=lon0, datum='WGS84')
-            x, y = proj(df['GPS.LongitudeFloat'].values,
-                        df['GPS.LatitudeFloat'].values)
-            df['GPS.X(m)'] = x
-            df['GPS.Y(m)'] = y
-            df = df.drop(columns=['GPS.LatitudeFloat', 'GPS.LongitudeFloat'])
+            # Convert to contiguous float64 arrays in case they are strings, so that pyproj can
+            # project all of the points in one vectorized call
+            lon = np.ascontiguousarray(
+                pd.to_numeric(df['GPS.Longitude'], errors='coerce').to_numpy(dtype=np.float64))
+            lat = np.ascontiguousarray(
+                pd.to_numeric(df['GPS.Latitude'], errors='coerce').to_numpy(dtype=np.float64))
+            lon0 = np.nanmean(lon)
+            lat0 = np.nanmean(lat)
+            valid = ~(np.isnan(lon) | np.isnan(lat))
+            n_valid = np.count_nonzero(valid)
+            if (n_valid < SMALL_GPS_POINT_COUNT or
+                    np.ptp(lon[valid]) + np.ptp(lat[valid]) < SMALL_GPS_SPREAD_DEG):
+                # Few points, or all close together, so use an equirectangular approximation
+                x = (lon - lon0) * math.cos(math.radians(lat0)) * math.radians(1) * EARTH_RADIUS_M
+                y = (lat - lat0) * math.radians(1) * EARTH_RADIUS_M
+            else:
+                # Use pyproj for accurate projection (WGS84). The projection is centered on the
+                # center point rounded to 0.001 degrees (about 100 m), so that it can be reused for
+                # other logs from the same site, and the results are then offset so that they are
+                # still relative to the exact center point. Over the distances covered by a flight
+                # the difference from a projection centered on the exact point is negligible.
+                proj = _aeqd_projection(round(float(lat0), 3), round(float(lon0), 3))
+                x, y = proj(lon, lat)
+                x0, y0 = proj(lon0, lat0)
+                x = x - x0
+                y = y - y0
+            derived['GPS.X(m)'] = x
+            derived['GPS.Y(m)'] = y
             import_status += "Contains GPS data.\n"
         else:
             import_status += "No GPS data found.\n"
@@ -90,16 +408,18 @@ def load_log_file():
                 # Ensure 'Time' is in HH:MM:SS.f format (with one or more "f" digits). The typical problem
                 # is that if the file has gone through Excel and HH should have been '12' it may have
                 # been dropped and we only have MM:SS.f format with an implied '12:' at the front. If so,
-                # we prepend '12:' to the time.
-                if not re.match(r'^\d{1,2}:\d{2}:\d{2}\.\d+$', df['Time'].iloc[0]):
+                # we prepend '12:' to the time. The column normally holds strings already, so it
+                # is only converted if it doesn't.
+                time_series = _as_text(df['Time'])
+                if not TIME_PATTERN.match(time_series.iloc[0]):
                     print(
                         "Warning: 'Time' column format is not HH:MM:SS.f. Prepending '12:' to the time values.")
-                    df['Time'] = '12:' + df['Time'].astype(str)
+                    df['Time'] = '12:' + time_series
             else:
                 # If no Time column, generate one assuming start at 12:00:00 and 1 second between each sample
-                start_time = datetime.strptime("12:00:00.0", "%H:%M:%S.%f")
-                df['Time'] = [(start_time + pd.Timedelta(seconds=i)
-                               ).strftime("%H:%M:%S.%f")[:-3] for i in range(len(df))]
+                # The times are generated and formatted in one vectorized call rather than row by row
+                times = pd.date_range(start="1900-01-01 12:00:00", periods=len(df), freq="1s")
+                df['Time'] = times.strftime("%H:%M:%S.%f").str[:-3]
                 print(f"Warning: 'Time' column not found. Using generated time values starting at 12:00:00.0"
                       " with 1 second intervals.")
                 import_status += "No time data found.\n"
@@ -114,32 +434,45 @@ def load_log_file():
 
 
             # At this point we should have both Date and Time columns, either from the file or generated.
-            df['DateTime'] = pd.to_datetime(df['Date'].astype(str) + ' ' +
-                                            df['Time'].astype(str),
-                                            errors='coerce')
-
-            # Calculate ElapsedTime as an offset from the first DateTime
-            if not df['DateTime'].isnull().all():
-                first_time = df['DateTime'].iloc[0]
-                df['ElapsedTime'] = (
-                    df['DateTime'] - first_time).dt.total_seconds()
+            # They are normally in the format written by the radio, which is parsed directly with
+            # DATETIME_FORMAT. Only if some of the values don't match it (e.g. a file edited in
+            # Excel) is the slower parse that infers the format used.
+            combined = _as_text(df['Date']).str.cat(_as_text(df['Time']), sep=' ')
+            date_time = pd.to_datetime(combined, format=DATETIME_FORMAT, errors='coerce')
+            if date_time.isna().any():
+                date_time = pd.to_datetime(combined, errors='coerce')
+            derived['DateTime'] = date_time
+
+            # Calculate ElapsedTime as an offset from the first DateTime, in seconds. This is done
+            # on the underlying datetime64 array, without creating Timedelta objects.
+            if not date_time.isnull().all():
+                date_time_values = date_time.to_numpy()
+                derived['ElapsedTime'] = ((date_time_values - date_time_values[0]) /
+                                          np.timedelta64(1, 's'))
             else:
-                df['ElapsedTime'] = None
+                derived['ElapsedTime'] = None
 
         # Compute Power (W) if VFAS(V) and Current(A) are present
         if 'VFAS(V)' in df.columns and 'Current(A)' in df.columns:
-            df['Power (W)'] = df['VFAS(V)'] * df['Current(A)']
+            # The derived columns are computed directly on the NumPy arrays, as there is no need
+            # for the index alignment done by pandas arithmetic
+            derived['Power (W)'] = np.multiply(df['VFAS(V)'].to_numpy(), df['Current(A)'].to_numpy())
             import_status += "Generated 'Power (W)' data.\n"
 
         # Compute LiPo Total (V) if any LiPo? (V) columns exist
-        lipo_cols = [col for col in df.columns if re.match(
-            r"LiPo\d+\(V\)", col)]
-        if lipo_cols:
-            df['LiPo Total (V)'] = df[lipo_cols].sum(axis=1)
+        lipo_mask = df.columns.str.match(LIPO_COLUMN_PATTERN)
+        if lipo_mask.any():
+            # nansum skips missing cell voltages, as DataFrame.sum does
+            derived['LiPo Total (V)'] = np.nansum(df.loc[:, lipo_mask].to_numpy(dtype=float), axis=1)
             import_status += "Generated 'LiPo Total (V)' data.\n"
 
-        # Sort columns alphabetically
-        df = df[sorted(df.columns)]
+        df = df.assign(**derived)
+
+        # The columns are left in the order they were read and created, rather than copying the
+        # whole DataFrame to sort them. They are sorted alphabetically where the order is shown,
+        # i.e. in the log data window and in exported files.
+
+        write_cached_log(filename, df, import_status)
 
         print(f"File '{filename}' imported successfully.")
         return df, filename, import_status
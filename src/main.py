@@ -34,12 +34,67 @@ SOFTWARE.
 import os
 from tkinter import Label, Tk, Button
 from load_log_file import load_log_file
-from display_log_data import display_log_data
-from display_2d_gps_data import display_2d_gps_data
-from display_3d_gps_data import display_3d_gps_data
-from create_kml_file import create_kml_file
-from create_kml_file import view_kml_file
-from export_processed_log_file import export_processed_log_file
+
+class App:
+    """
+    Holds the loaded log for the main window, and provides the actions of its buttons.
+
+    The buttons call bound methods of the App rather than lambdas that capture the DataFrame, so
+    the log is only referenced from here, and replacing self.df releases the previous one.
+
+    The modules behind the buttons (matplotlib, tkintermapview, lxml, ...) are only imported when
+    their button is first used, so that they do not slow down the start of the application.
+
+    Args:
+        df (pd.DataFrame): The preprocessed log data.
+        filename (str): The path to the loaded log file.
+    """
+
+    def __init__(self, df, filename):
+        self.df = df
+        self.filename = filename
+
+    def show_log_data(self):
+        """
+        Displays the log data.
+        """
+        from display_log_data import display_log_data
+        display_log_data(self.df, self.filename)
+
+    def show_2d_gps_data(self):
+        """
+        Displays the 2D GPS data.
+        """
+        from display_2d_gps_data import display_2d_gps_data
+        display_2d_gps_data(self.df, self.filename)
+
+    def show_3d_gps_data(self):
+        """
+        Displays the 3D GPS data.
+        """
+        from display_3d_gps_data import display_3d_gps_data
+        display_3d_gps_data(self.df, self.filename)
+
+    def create_kml(self):
+        """
+        Creates a KML file.
+        """
+        from create_kml_file import create_kml_file
+        create_kml_file(self.df, self.filename)
+
+    def view_kml(self):
+        """
+        Views the KML file.
+        """
+        from create_kml_file import view_kml_file
+        view_kml_file(self.df, self.filename)
+
+    def export_log_file(self):
+        """
+        Exports the processed log file.
+        """
+        from export_processed_log_file import export_processed_log_file
+        export_processed_log_file(self.df, self.filename)
 
 
 def main():
@@ -61,9 +116,16 @@ def main():
     Button availability is determined by the presence of required columns in the loaded DataFrame.
     """
 
-    df, filename, import_status = load_log_file()
-
+    # The same Tk root is used for the file dialog and the main window. It is hidden while the
+    # file is selected and loaded.
     root = Tk()
+    root.withdraw()
+    df, filename, import_status = load_log_file(root)
+    root.deiconify()
+    # The log is only referenced from the App, so that replacing app.df releases it
+    app = App(df, filename)
+    del df
+
     root.title("Ethos Log Analyzer")
     # Set minimum window size. It automatically resizes to fit the content, but doesn't look good
     # when too narrow, which happens with short filenames, and this prevents that from happening.
@@ -76,35 +138,35 @@ def main():
     Label(root, text=f'"{os.path.basename(filename)}" imported.\n' + import_status,
           font=("Arial", 12, "bold")).pack(pady=10)
 
-    has_gps = {'GPS.Latitude', 'GPS.Longitude'}.issubset(df.columns)
+    has_gps = {'GPS.Latitude', 'GPS.Longitude'}.issubset(app.df.columns)
     has_gps_with_altitude = {'GPS.Latitude',
-                             'GPS.Longitude', 'GPS alt(m)'} .issubset(df.columns)
+                             'GPS.Longitude', 'GPS alt(m)'} .issubset(app.df.columns)
 
     Button(root, text="Display Log Data", width=20, height=2,
-           command=lambda: display_log_data(df, filename)).pack(pady=5)
+           command=app.show_log_data).pack(pady=5)
 
     btn_2d = Button(root, text="Display 2D GPS Data", width=20, height=2,
-                    command=lambda: display_2d_gps_data(df, filename),
+                    command=app.show_2d_gps_data,
                     state="normal" if has_gps else "disabled")
     btn_2d.pack(pady=5)
 
     btn_3d = Button(root, text="Display 3D GPS Data", width=20, height=2,
-                    command=lambda: display_3d_gps_data(df, filename),
+                    command=app.show_3d_gps_data,
                     state="normal" if has_gps_with_altitude else "disabled")
     btn_3d.pack(pady=5)
 
     btn_kml = Button(root, text="Create KML File", width=20, height=2,
-                     command=lambda: create_kml_file(df, filename),
+                     command=app.create_kml,
                      state="normal" if has_gps else "disabled")
     btn_kml.pack(pady=5)
 
     btn_view_kml = Button(root, text="View KML File", width=20, height=2,
-                          command=lambda: view_kml_file(df, filename),
+                          command=app.view_kml,
                           state="normal" if has_gps else "disabled")
     btn_view_kml.pack(pady=5)
 
     btn_export = Button(root, text="Export Processed Log File", width=20, height=2,
-                        command=lambda: export_processed_log_file(df, filename))
+                        command=app.export_log_file)
     btn_export.pack(pady=5)
 
     Button(root, text="Exit", width=20, height=2, bg='lightcoral',
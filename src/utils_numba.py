@@ -0,0 +1,119 @@
+"""
+Module for numerical helpers that are compiled with Numba when it is available.
+
+The functions here are written as plain loops over NumPy arrays so that Numba can compile them to
+machine code. If Numba is not installed they still work, but run as ordinary (much slower) Python,
+or skip work that is only an optimization. Compiled code is cached on disk, so the compilation
+cost is only paid on the first run.
+
+Functions:
+    rdp_mask(points, eps): Select the points kept by Ramer-Douglas-Peucker path simplification.
+"""
+
+import math
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """
+        Stand-in for numba.njit when Numba is not installed. Returns the function unchanged.
+        """
+        def decorator(func):
+            return func
+        return decorator
+
+
+def rdp_mask(points, eps):
+    """
+    Select the points kept by Ramer-Douglas-Peucker simplification of a path.
+
+    A point is kept if it lies further than eps from the straight line joining the kept points on
+    either side of it. The first and last points are always kept. The simplification is only done
+    if Numba is installed. As plain Python it would take longer than drawing or writing the full
+    path, so without Numba every point is kept.
+
+    Args:
+        points (np.ndarray): Array of shape (N, D) with the path coordinates (D = 2 or 3).
+        eps (float): Distance tolerance, in the same units as the coordinates.
+
+    Returns:
+        np.ndarray: Boolean array of length N, True for the points to keep.
+    """
+    if not NUMBA_AVAILABLE:
+        return np.ones(points.shape[0], dtype=np.bool_)
+    return _rdp_mask(points, eps)
+
+
+@njit(cache=True)
+def _rdp_mask(points, eps):
+    """
+    Compiled implementation of rdp_mask. The algorithm is implemented with an explicit stack of
+    index ranges rather than recursion, so it can be compiled by Numba.
+
+    Args:
+        points (np.ndarray): Array of shape (N, D) with the path coordinates (D = 2 or 3).
+        eps (float): Distance tolerance, in the same units as the coordinates.
+
+    Returns:
+        np.ndarray: Boolean array of length N, True for the points to keep.
+    """
+    n = points.shape[0]
+    n_dims = points.shape[1]
+    mask = np.zeros(n, dtype=np.bool_)
+    if n == 0:
+        return mask
+    mask[0] = True
+    mask[n - 1] = True
+
+    # Each range on the stack is split into at most two new ones, and the ranges never overlap,
+    # so there can never be more than n of them waiting.
+    stack = np.empty((n, 2), dtype=np.int64)
+    stack[0, 0] = 0
+    stack[0, 1] = n - 1
+    top = 1
+
+    while top > 0:
+        top -= 1
+        first = stack[top, 0]
+        last = stack[top, 1]
+        if last - first < 2:
+            continue
+
+        seg_len_sq = 0.0
+        for k in range(n_dims):
+            d = points[last, k] - points[first, k]
+            seg_len_sq += d * d
+
+        # Find the point furthest from the line joining the first and last points of the range
+        max_dist_sq = -1.0
+        index = first
+        for i in range(first + 1, last):
+            # Projection of the point onto the segment, as a fraction of its length
+            t = 0.0
+            if seg_len_sq > 0.0:
+                for k in range(n_dims):
+                    t += (points[i, k] - points[first, k]) * (points[last, k] - points[first, k])
+                t /= seg_len_sq
+            dist_sq = 0.0
+            for k in range(n_dims):
+                d = points[i, k] - (points[first, k] + t * (points[last, k] - points[first, k]))
+                dist_sq += d * d
+            if dist_sq > max_dist_sq:
+                max_dist_sq = dist_sq
+                index = i
+
+        if math.sqrt(max_dist_sq) > eps:
+            mask[index] = True
+            stack[top, 0] = first
+            stack[top, 1] = index
+            top += 1
+            stack[top, 0] = index
+            stack[top, 1] = last
+            top += 1
+
+    return mask